@@ -1,13 +1,21 @@
 import argparse
-import requests
-import json
+import asyncio
+import aiofiles
+import aiohttp
+import bisect
+import logging
 import os
-import glob
-import time
 import random
+import re
+import sqlite3
 import sys
+import time
 from typing import List, Dict, Any, Optional
 
+import orjson
+
+from aiolimiter import AsyncLimiter
+
 # Define the base URL for the SubDL API
 SUBDL_SEARCH_URL = "https://api.subdl.com/api/v1/subtitles"
 SUBDL_UPLOAD_API_URL = "https://api3.subdl.com/user"
@@ -15,146 +23,302 @@ SUBDL_UPLOAD_API_URL = "https://api3.subdl.com/user"
 LINK_PREFIX = "https://dl.subdl.com"
 
 # --- Configuration for Processed Items ---
+PROCESSED_DB_FILE = "processed_subtitles.db"
+# Legacy plain-text log, imported into the database on first run
 PROCESSED_LOG_FILE = "processed_subtitles.log"
+# Commit pending processed-item inserts every this many saves
+PROCESSED_COMMIT_INTERVAL = 16
+
+# Generic release-group names whose files are skipped entirely
+UNWANTED_GROUPS = frozenset({"sickbeard", "radarr", "sonarr"})
+
+# Tags like .hi.srt, .sdh.srt or .cc.srt mark hearing-impaired subtitles
+HI_RE = re.compile(r"\.(hi|sdh|cc)\.", re.I)
+
+# --- SubDL Rate Limiting ---
+# Sustained request budget against the SubDL API (requests per minute)
+SUBDL_RATE_LIMIT = 10
 
-# --- Helper Function for API Delay ---
-def subdl_api_delay():
-    """Waits for a random duration between 5 to 10 seconds."""
-    delay_seconds = random.uniform(5, 10)
-    # This print statement can be commented out if you prefer a quieter script
-    print(f"    (Waiting for {delay_seconds:.2f} seconds before next SubDL API call...)")
-    time.sleep(delay_seconds)
+# How long a cached SubDL search result stays valid (seconds)
+SEARCH_CACHE_TTL = 24 * 3600
 
-# --- Subdl API Functions (with delay added) ---
+# Maximum number of 3-step uploads allowed in flight at once
+UPLOAD_CONCURRENCY_LIMIT = 4
 
-def search_subtitles(api_key: str, imdb_id: str = None, tmdb_id: str = None, type: str = None, languages: str = None, season_number: int = None, episode_number: int = None) -> Dict[str, Any]:
+# --- HTTP Retry Configuration ---
+RETRY_ATTEMPTS = 3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Serializes interactive upload prompts so concurrent items don't talk over each other
+prompt_lock = asyncio.Lock()
+
+log = logging.getLogger(__name__)
+
+# --- HTTP Retry Helper ---
+
+async def request_with_retry(session: aiohttp.ClientSession, method: str, url: str, limiter: Optional[AsyncLimiter] = None, data_factory=None, **kwargs) -> aiohttp.ClientResponse:
     """
-    Searches for subtitles on SubDL, requesting release info as well.
-    Can now also search for specific TV episodes.
+    Issues an HTTP request, retrying rate-limit and server errors (429/5xx)
+    with exponential backoff plus jitter. Honours the Retry-After header when
+    the server provides one. A transient failure costs one retry instead of
+    failing the whole item. The caller is responsible for releasing the
+    returned response.
     """
-    subdl_api_delay()
-    params = {
-        "api_key": api_key,
-        "imdb_id": imdb_id,
-        "tmdb_id": tmdb_id,
-        "type": type,
-        "languages": languages,
-        "season_number": season_number,
-        "episode_number": episode_number,
-        "subs_per_page": 30,
-        "releases": 1
-    }
-    try:
-        filtered_params = {k: v for k, v in params.items() if v is not None}
-        response = requests.get(SUBDL_SEARCH_URL, params=filtered_params)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return {"status": False, "error": f"Request failed with status code {response.status_code}"}
-    except requests.RequestException as e:
-        return {"status": False, "error": f"An error occurred: {e}"}
-
-def get_n_id(token: str) -> Optional[str]:
+    backoff = 1.0
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        if data_factory is not None:
+            kwargs['data'] = data_factory()
+        if limiter is not None:
+            await limiter.acquire()
+        response = await session.request(method, url, **kwargs)
+        if response.status not in RETRY_STATUSES or attempt == RETRY_ATTEMPTS:
+            return response
+        retry_after = response.headers.get("Retry-After")
+        try:
+            wait_seconds = float(retry_after) if retry_after else backoff
+        except ValueError:
+            wait_seconds = backoff
+        wait_seconds += random.uniform(0, 1)
+        print(f"    (HTTP {response.status} from {url}, retrying in {wait_seconds:.1f} seconds... attempt {attempt}/{RETRY_ATTEMPTS})")
+        response.release()
+        await asyncio.sleep(wait_seconds)
+        backoff *= 2
+
+# --- Subdl API Client ---
+
+class SubdlClient:
     """
-    Step 1: Get a unique ID (n_id) for the upload session.
+    Shared client for all SubDL API calls. A token bucket limiter gates every
+    request so concurrent coroutines collectively stay under the API's rate
+    limit instead of each sleeping a fixed delay.
     """
-    subdl_api_delay()
-    try:
-        headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(f"{SUBDL_UPLOAD_API_URL}/getNId", headers=headers)
-        
-        if response.status_code == 200 and response.json().get("ok"):
-            return response.json().get("n_id")
-        else:
-            print(f"Error getting n_id. Status Code: {response.status_code}. Response: {response.text}")
-            return None
-    except (requests.RequestException, json.JSONDecodeError) as e:
-        print(f"An error occurred while getting n_id: {e}")
+
+    def __init__(self, session: aiohttp.ClientSession, search_key: str, upload_token: str, db: Optional[sqlite3.Connection] = None):
+        self.session = session
+        self.search_key = search_key
+        self.upload_token = upload_token
+        self.limiter = AsyncLimiter(SUBDL_RATE_LIMIT, 60)
+        self.db = db
+        self._search_cache: Dict[str, Dict[str, Any]] = {}
+        # Bounds in-flight uploads so search traffic can keep flowing while
+        # a gather over many items doesn't storm the upload endpoints
+        self.upload_sem = asyncio.Semaphore(UPLOAD_CONCURRENCY_LIMIT)
+
+    @property
+    def _auth_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.upload_token}"}
+
+    def _cached_search(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Returns a cached search result from memory or the database, if still fresh."""
+        result = self._search_cache.get(cache_key)
+        if result is not None:
+            return result
+        if self.db is not None:
+            row = self.db.execute("SELECT ts, result FROM search_cache WHERE query_key=?", (cache_key,)).fetchone()
+            if row and time.time() - row[0] < SEARCH_CACHE_TTL:
+                result = orjson.loads(row[1])
+                self._search_cache[cache_key] = result
+                return result
         return None
 
-def upload_subtitle_file(token: str, n_id: str, file_path: str) -> Optional[Dict[str, Any]]:
-    """
-    Step 2: Upload the actual subtitle file.
-    """
-    subdl_api_delay()
-    try:
-        with open(file_path, 'rb') as f:
-            files = {'subtitle': (os.path.basename(file_path), f)}
-            data = {'n_id': n_id}
-            headers = {"Authorization": f"Bearer {token}"}
-            response = requests.post(f"{SUBDL_UPLOAD_API_URL}/uploadSingleSubtitle", headers=headers, files=files, data=data)
-            
-            if response.status_code == 200 and response.json().get("ok"):
-                return response.json().get("file")
-            else:
-                print(f"Error uploading file {os.path.basename(file_path)}: {response.text}")
+    def _store_search(self, cache_key: str, result: Dict[str, Any]) -> None:
+        """Caches a successful search result in memory and the database."""
+        self._search_cache[cache_key] = result
+        if self.db is not None:
+            try:
+                self.db.execute("INSERT OR REPLACE INTO search_cache(query_key, ts, result) VALUES(?, ?, ?)",
+                                (cache_key, int(time.time()), orjson.dumps(result).decode()))
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not cache search result: {e}")
+
+    async def _check_rate_limit_headers(self, response: aiohttp.ClientResponse) -> None:
+        """Backs off if the API signals the rate-limit budget is spent."""
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            retry_after = response.headers.get("Retry-After")
+            try:
+                wait_seconds = float(retry_after) if retry_after else 60.0
+            except ValueError:
+                wait_seconds = 60.0
+            print(f"    (SubDL rate limit reached, backing off for {wait_seconds:.0f} seconds...)")
+            await asyncio.sleep(wait_seconds)
+
+    async def search_subtitles(self, imdb_id: str = None, tmdb_id: str = None, type: str = None, languages: str = None, season_number: int = None, episode_number: int = None) -> Dict[str, Any]:
+        """
+        Searches for subtitles on SubDL, requesting release info as well.
+        Can now also search for specific TV episodes.
+        """
+        cache_key = f"{imdb_id}|{tmdb_id}|{type}|{languages}|{season_number}|{episode_number}"
+        cached = self._cached_search(cache_key)
+        if cached is not None:
+            return cached
+
+        params = {
+            "api_key": self.search_key,
+            "imdb_id": imdb_id,
+            "tmdb_id": tmdb_id,
+            "type": type,
+            "languages": languages,
+            "season_number": season_number,
+            "episode_number": episode_number,
+            "subs_per_page": 30,
+            "releases": 1
+        }
+        try:
+            filtered_params = {k: v for k, v in params.items() if v is not None}
+            async with await request_with_retry(self.session, "GET", SUBDL_SEARCH_URL, limiter=self.limiter, params=filtered_params) as response:
+                await self._check_rate_limit_headers(response)
+                if response.status == 200:
+                    result = orjson.loads(await response.read())
+                    if result.get("status"):
+                        self._store_search(cache_key, result)
+                    return result
+                else:
+                    return {"status": False, "error": f"Request failed with status code {response.status}"}
+        except aiohttp.ClientError as e:
+            return {"status": False, "error": f"An error occurred: {e}"}
+
+    async def get_n_id(self) -> Optional[str]:
+        """
+        Step 1: Get a unique ID (n_id) for the upload session.
+        """
+        try:
+            async with await request_with_retry(self.session, "GET", f"{SUBDL_UPLOAD_API_URL}/getNId", limiter=self.limiter, headers=self._auth_headers) as response:
+                await self._check_rate_limit_headers(response)
+                if response.status == 200:
+                    body = orjson.loads(await response.read())
+                    if body.get("ok"):
+                        return body.get("n_id")
+                print(f"Error getting n_id. Status Code: {response.status}. Response: {await response.text()}")
                 return None
-    except (requests.RequestException, FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"An error occurred during file upload: {e}")
-        return None
+        except (aiohttp.ClientError, orjson.JSONDecodeError) as e:
+            print(f"An error occurred while getting n_id: {e}")
+            return None
 
-def complete_subtitle_upload(token: str, n_id: str, file_n_id: str, metadata: Dict[str, Any]) -> bool:
-    """
-    Step 3: Submit all metadata to finalize the upload.
-    """
-    subdl_api_delay()
-    data = {
-        "file_n_ids": json.dumps([file_n_id]),
-        "n_id": n_id,
-        **metadata
-    }
-    try:
-        headers = {"Authorization": f"Bearer {token}"}
-        response = requests.post(f"{SUBDL_UPLOAD_API_URL}/uploadSubtitle", headers=headers, data=data)
-        
-        upload_result = response.json()
-        print(f"     -> API Upload Response: {json.dumps(upload_result, indent=4)}")
-
-        if response.status_code == 200 and upload_result.get("status"):
-            print(f"     -> Successfully submitted for review: {metadata.get('name')}")
-            return True
-        else:
-            print(f"     -> Error completing subtitle upload for {metadata.get('name')}")
+    async def upload_subtitle_file(self, n_id: str, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Step 2: Upload the actual subtitle file.
+        """
+        try:
+            async with aiofiles.open(file_path, 'rb') as f:
+                subtitle_bytes = await f.read()
+
+            # A FormData body is consumed on send, so build a fresh one per attempt
+            def build_form():
+                form = aiohttp.FormData()
+                form.add_field('subtitle', subtitle_bytes, filename=os.path.basename(file_path))
+                form.add_field('n_id', n_id)
+                return form
+
+            async with await request_with_retry(self.session, "POST", f"{SUBDL_UPLOAD_API_URL}/uploadSingleSubtitle", limiter=self.limiter, data_factory=build_form, headers=self._auth_headers) as response:
+                await self._check_rate_limit_headers(response)
+                if response.status == 200:
+                    body = orjson.loads(await response.read())
+                    if body.get("ok"):
+                        return body.get("file")
+                print(f"Error uploading file {os.path.basename(file_path)}: {await response.text()}")
+                return None
+        except (aiohttp.ClientError, FileNotFoundError, orjson.JSONDecodeError) as e:
+            print(f"An error occurred during file upload: {e}")
+            return None
+
+    async def complete_subtitle_upload(self, n_id: str, file_n_id: str, metadata: Dict[str, Any]) -> bool:
+        """
+        Step 3: Submit all metadata to finalize the upload.
+        """
+        data = {
+            "file_n_ids": orjson.dumps([file_n_id]).decode(),
+            "n_id": n_id,
+            **metadata
+        }
+        try:
+            async with await request_with_retry(self.session, "POST", f"{SUBDL_UPLOAD_API_URL}/uploadSubtitle", limiter=self.limiter, data=data, headers=self._auth_headers) as response:
+                await self._check_rate_limit_headers(response)
+                upload_result = orjson.loads(await response.read())
+                log.debug("API Upload Response: %r", upload_result)
+
+                if response.status == 200 and upload_result.get("status"):
+                    print(f"     -> Successfully submitted for review: {metadata.get('name')}")
+                    return True
+                else:
+                    print(f"     -> Error completing subtitle upload for {metadata.get('name')}")
+                    return False
+        except (aiohttp.ClientError, orjson.JSONDecodeError) as e:
+            print(f"An error occurred completing the upload or decoding the response: {e}")
             return False
-    except (requests.RequestException, json.JSONDecodeError) as e:
-        print(f"An error occurred completing the upload or decoding the response: {e}")
-        return False
 
-# --- Sonarr/Radarr API Functions ---
+# --- Sonarr/Radarr API Client ---
 
-def get_from_arr(api_url: str, api_key: str, endpoint: str) -> List[Dict[str, Any]]:
+class ArrClient:
     """
-    Generic function to get all items from a Sonarr/Radarr endpoint.
+    Thin client for a Sonarr/Radarr instance. Carries the base URL and API key
+    so every call reuses the shared pooled session with the right auth header.
     """
-    try:
-        response = requests.get(f"{api_url}/api/v3/{endpoint}", headers={"X-Api-Key": api_key})
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error connecting to {api_url}: {e}")
-        return []
 
-# --- Helper Functions for Processed Items ---
+    def __init__(self, session: aiohttp.ClientSession, api_url: str, api_key: str):
+        self.session = session
+        self.api_url = api_url
+        self.headers = {"X-Api-Key": api_key}
 
-def load_processed_list(filename: str = PROCESSED_LOG_FILE) -> set:
-    """Loads the set of processed items from a file."""
-    processed = set()
-    if os.path.exists(filename):
+    async def get(self, endpoint: str) -> List[Dict[str, Any]]:
+        """
+        Generic function to get all items from a Sonarr/Radarr endpoint.
+        """
         try:
-            with open(filename, 'r') as f:
-                for line in f:
-                    processed.add(line.strip())
-        except IOError as e:
-            print(f"Warning: Could not read processed list from {filename}: {e}")
-    return processed
-
-def save_processed_item(item_key: str, filename: str = PROCESSED_LOG_FILE) -> None:
-    """Appends an item to the processed list file."""
+            async with await request_with_retry(self.session, "GET", f"{self.api_url}/api/v3/{endpoint}", headers=self.headers) as response:
+                response.raise_for_status()
+                return orjson.loads(await response.read())
+        except aiohttp.ClientError as e:
+            print(f"Error connecting to {self.api_url}: {e}")
+            return []
+
+# --- Helper Functions for Processed Items ---
+
+def open_processed_db(filename: str = PROCESSED_DB_FILE) -> sqlite3.Connection:
+    """Opens (creating if necessary) the processed-items database."""
+    conn = sqlite3.connect(filename)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS processed(key TEXT PRIMARY KEY, ts INTEGER)")
+    conn.execute("CREATE TABLE IF NOT EXISTS search_cache(query_key TEXT PRIMARY KEY, ts INTEGER, result TEXT)")
+    conn.commit()
+    return conn
+
+def import_legacy_log(conn: sqlite3.Connection, filename: str = PROCESSED_LOG_FILE) -> None:
+    """One-time import of the old plain-text processed log into the database."""
+    if not os.path.exists(filename):
+        return
+    if conn.execute("SELECT 1 FROM processed LIMIT 1").fetchone():
+        return
     try:
-        with open(filename, 'a') as f:
-            f.write(item_key + '\n')
+        with open(filename, 'r') as f:
+            rows = [(line.strip(), int(time.time())) for line in f if line.strip()]
+        conn.executemany("INSERT OR IGNORE INTO processed(key, ts) VALUES(?, ?)", rows)
+        conn.commit()
+        print(f"Imported {len(rows)} items from legacy {filename} into {PROCESSED_DB_FILE}.")
     except IOError as e:
-        print(f"Warning: Could not write to processed list file {filename}: {e}")
+        print(f"Warning: Could not import legacy processed list from {filename}: {e}")
+
+def load_processed_list(conn: sqlite3.Connection) -> set:
+    """Loads the set of processed items from the database."""
+    return {row[0] for row in conn.execute("SELECT key FROM processed")}
+
+_pending_saves = 0
+
+def save_processed_item(conn: sqlite3.Connection, item_key: str) -> None:
+    """
+    Records an item as processed in the database. Inserts are committed in
+    batches rather than fsync-ing per item; main_async commits the remainder
+    on shutdown.
+    """
+    global _pending_saves
+    try:
+        conn.execute("INSERT OR IGNORE INTO processed(key, ts) VALUES(?, ?)", (item_key, int(time.time())))
+        _pending_saves += 1
+        if _pending_saves >= PROCESSED_COMMIT_INTERVAL:
+            conn.commit()
+            _pending_saves = 0
+    except sqlite3.Error as e:
+        print(f"Warning: Could not record processed item {item_key}: {e}")
 
 def get_item_key(item_type: str, tmdb_id: str, season: int = 0, episode: int = 0, imdb_id: Optional[str] = None) -> str:
     """Generates a unique key for an item to store in the processed list."""
@@ -166,115 +330,142 @@ def get_item_key(item_type: str, tmdb_id: str, season: int = 0, episode: int = 0
 
 # --- Helper Functions for File Operations ---
 
-def find_local_path(media_path: str, base_paths: List[str]) -> Optional[str]:
+def build_folder_map(base_paths: List[str]) -> Dict[str, str]:
     """
-    Tries to find the correct local path for a media item given a list of base paths.
+    Lists each base path once and maps folder name -> full local path. Earlier
+    base paths win if the same folder name exists in more than one. Replaces
+    an os.path.isdir probe per base path per item with a single listing.
     """
-    folder_name = os.path.basename(media_path)
+    folders: Dict[str, str] = {}
     for base_path in base_paths:
-        potential_path = os.path.join(base_path, folder_name)
-        if os.path.isdir(potential_path):
-            return potential_path
-    return None
+        try:
+            with os.scandir(base_path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        folders.setdefault(entry.name, os.path.join(base_path, entry.name))
+        except OSError as e:
+            print(f"Warning: Could not list base path {base_path}: {e}")
+    return folders
+
+def find_local_path(media_path: str, folder_map: Dict[str, str]) -> Optional[str]:
+    """
+    Finds the correct local path for a media item from the prebuilt folder map.
+    """
+    return folder_map.get(os.path.basename(media_path))
+
+def build_srt_index(base_paths: List[str]) -> Dict[str, List[str]]:
+    """
+    Walks the base paths once and records every .srt file, keyed by directory.
+    Avoids a fresh directory listing (glob) for every single video file,
+    which adds up quickly on NFS/SMB mounts.
+    """
+    srt_index: Dict[str, List[str]] = {}
+    for base_path in base_paths:
+        for dirpath, _, filenames in os.walk(base_path):
+            srt_files = sorted(f for f in filenames if f.endswith('.srt'))
+            if srt_files:
+                srt_index[dirpath] = srt_files
+    return srt_index
 
-def find_matching_srt_file(video_filepath: str) -> Optional[str]:
+def find_matching_srt_file(video_filepath: str, srt_index: Dict[str, List[str]]) -> Optional[str]:
     """
-    Given a full video file path, finds a matching .srt file.
+    Given a full video file path, finds a matching .srt file from the index.
     Example: /path/to/video.mkv -> /path/to/video.srt or /path/to/video.en.srt
     """
-    base, _ = os.path.splitext(video_filepath)
-    srt_files = glob.glob(f"{base}*.srt")
-    if srt_files:
-        return srt_files[0] # Return the first match
+    dirname = os.path.dirname(video_filepath)
+    base, _ = os.path.splitext(os.path.basename(video_filepath))
+    candidates = srt_index.get(dirname, [])
+    # Candidates are sorted, so the first entry >= base is the first match
+    i = bisect.bisect_left(candidates, base)
+    if i < len(candidates) and candidates[i].startswith(base):
+        return os.path.join(dirname, candidates[i])
     return None
 
 def is_hearing_impaired(filename: str) -> bool:
     """
     Checks for common Hearing Impaired tags in a subtitle filename.
     """
-    fn_lower = filename.lower()
-    # Check for tags like .hi.srt, .sdh.srt, .cc.srt
-    hi_tags = ['.hi.', '.sdh.', '.cc.']
-    return any(tag in fn_lower for tag in hi_tags)
+    return bool(HI_RE.search(filename))
 
 # --- Movie Processing ---
 
-def process_movies(radarr_url: str, radarr_api_key: str, radarr_base_paths: List[str], subdl_search_key: str, subdl_upload_token: str, language: str, processed_items: set, always_upload: bool):
+async def process_movies(movies: List[Dict[str, Any]], subdl: SubdlClient, radarr_base_paths: List[str], language: str, db: sqlite3.Connection, processed_items: set, always_upload: bool):
     """
     Main processing loop for Radarr movies.
     """
     print("\n--- Processing Radarr Movies ---")
-    movies = get_from_arr(radarr_url, radarr_api_key, "movie")
-    for movie in movies:
+    folder_map = build_folder_map(radarr_base_paths)
+    srt_index = build_srt_index(radarr_base_paths)
+
+    async def handle_movie(movie: Dict[str, Any]):
         title = movie.get("title")
         year = movie.get("year")
         tmdb_id = movie.get("tmdbId")
-        
+
         if not movie.get('hasFile'):
             print(f"\n-> Skipping '{title} ({year})' as it is not downloaded.")
-            continue
-        
+            return
+
         movie_key = get_item_key("movie", tmdb_id=str(tmdb_id))
 
         if movie_key in processed_items:
             print(f"\n-> Skipping '{title} ({year})' as it was already processed.")
-            continue
+            return
 
         local_release_group = movie.get('movieFile', {}).get('releaseGroup')
 
         # --- FINAL: Check for unwanted generic release groups ---
-        unwanted_groups = ["sickbeard", "radarr", "sonarr"]
-        if local_release_group and local_release_group.lower() in unwanted_groups:
+        if local_release_group and local_release_group.lower() in UNWANTED_GROUPS:
             print(f"\n-> Skipping '{title} ({year})' because it has a generic release group ('{local_release_group}').")
-            continue
+            return
         # --- END FINAL CHECK ---
 
         path = movie.get("path")
         imdb_id = movie.get("imdbId")
         video_filename = movie.get('movieFile', {}).get('relativePath')
-        
+
         if not path:
-            continue
-            
+            return
+
         print(f"\nProcessing Movie: {title} ({year})")
         if local_release_group:
              print(f"  -> Local Release Group: {local_release_group}")
         else:
             print(f"  -> WARNING: Could not determine release group for '{title}'. Will perform a general check.")
 
-        local_path = find_local_path(path, radarr_base_paths)
+        local_path = find_local_path(path, folder_map)
 
         if not local_path:
             print(f"  -> Could not find local path for '{path}' in base paths: {radarr_base_paths}")
-            continue
+            return
 
         if not video_filename:
             print("  -> Could not determine video filename from Radarr API. Skipping.")
-            continue
+            return
 
         video_filepath = os.path.join(local_path, video_filename)
-        srt_path = find_matching_srt_file(video_filepath)
+        srt_path = find_matching_srt_file(video_filepath, srt_index)
 
         if not srt_path:
             print("  -> No matching local .srt file found for the video file.")
-            continue
+            return
 
         print(f"  -> Found matching subtitle file: {os.path.basename(srt_path)}")
-        
+
         is_hi = is_hearing_impaired(os.path.basename(srt_path))
         print(f"  -> Hearing Impaired detected: {is_hi}")
 
         print("  -> Checking for existing subtitles on SubDL...")
-        existing_subs_data = search_subtitles(api_key=subdl_search_key, tmdb_id=str(tmdb_id), type="movie", languages=language)
+        existing_subs_data = await subdl.search_subtitles(tmdb_id=str(tmdb_id), type="movie", languages=language)
 
         found_match = False
         if existing_subs_data.get("status") and existing_subs_data.get("subtitles"):
             if local_release_group:
+                rg_cf = local_release_group.casefold()
                 for subtitle in existing_subs_data["subtitles"]:
-                    if any(local_release_group.lower() in r.lower() for r in subtitle.get('releases', [])):
+                    if any(rg_cf in r.casefold() for r in subtitle.get('releases', [])):
                         print(f"  -> Found matching subtitle for release group '{local_release_group}'. Skipping.")
-                        print("     --- Matching Subtitle Details ---")
-                        print(json.dumps(subtitle, indent=4))
+                        log.debug("Matching subtitle: %r", subtitle)
                         found_match = True
                         break
             else:
@@ -282,9 +473,9 @@ def process_movies(radarr_url: str, radarr_api_key: str, radarr_base_paths: List
                 found_match = True
 
         if found_match:
-            save_processed_item(movie_key)
+            save_processed_item(db, movie_key)
             processed_items.add(movie_key)
-            continue
+            return
 
         print(f"  -> No matching subtitles found for language '{language}' and release '{local_release_group}'.")
 
@@ -296,18 +487,19 @@ def process_movies(radarr_url: str, radarr_api_key: str, radarr_base_paths: List
             except KeyboardInterrupt:
                 print("\nUpload cancelled by user. Moving to next movie.")
                 print("  -> Adding to processed list to avoid re-processing on next run.")
-                save_processed_item(movie_key)
+                save_processed_item(db, movie_key)
                 processed_items.add(movie_key)
-                continue
+                return
             do_upload = True
         else:
-            user_input = input(f"  ?? Do you want to upload the found subtitle file for '{title}'? (Y/n): ")
+            async with prompt_lock:
+                user_input = await asyncio.to_thread(input, f"  ?? Do you want to upload the found subtitle file for '{title}'? (Y/n): ")
             if user_input.lower() != 'n':
                 do_upload = True
 
         if do_upload:
-            if upload_single_subtitle(
-                subdl_upload_token=subdl_upload_token,
+            if await upload_single_subtitle(
+                subdl,
                 file_path=srt_path,
                 media_info={
                     "type": "movie",
@@ -320,72 +512,95 @@ def process_movies(radarr_url: str, radarr_api_key: str, radarr_base_paths: List
                     "is_hi": is_hi
                 }
             ):
-                save_processed_item(movie_key)
+                save_processed_item(db, movie_key)
                 processed_items.add(movie_key)
 
+    await asyncio.gather(*(handle_movie(movie) for movie in movies))
+
 
 # --- TV Show Processing ---
 
-def process_tv_shows(sonarr_url: str, sonarr_api_key: str, sonarr_base_paths: List[str], subdl_search_key: str, subdl_upload_token: str, language: str, processed_items: set, always_upload: bool):
+async def process_tv_shows(shows: List[Dict[str, Any]], sonarr: ArrClient, subdl: SubdlClient, sonarr_base_paths: List[str], language: str, db: sqlite3.Connection, processed_items: set, always_upload: bool):
     """
     Main processing loop for Sonarr TV shows, now episode by episode.
     """
     print("\n--- Processing Sonarr TV Shows ---")
-    shows = get_from_arr(sonarr_url, sonarr_api_key, "series")
 
-    for show in shows:
+    # Prefetch episode data for every eligible series up front, so the
+    # per-show loop below only does local lookups instead of two Sonarr
+    # round-trips per series. A semaphore keeps the burst polite.
+    eligible_ids = [show.get("id") for show in shows if show.get('statistics', {}).get('episodeFileCount', 0) > 0]
+    fetch_sem = asyncio.Semaphore(8)
+
+    async def fetch_series_data(series_id: int):
+        async with fetch_sem:
+            episode_files, episodes_metadata = await asyncio.gather(
+                sonarr.get(f"episodefile?seriesId={series_id}"),
+                sonarr.get(f"episode?seriesId={series_id}")
+            )
+        return series_id, episode_files, episodes_metadata
+
+    series_data = await asyncio.gather(*(fetch_series_data(series_id) for series_id in eligible_ids))
+    files_by_series = {series_id: files for series_id, files, _ in series_data}
+    episodes_by_series = {series_id: episodes for series_id, _, episodes in series_data}
+
+    folder_map = build_folder_map(sonarr_base_paths)
+    srt_index = build_srt_index(sonarr_base_paths)
+
+    async def handle_show(show: Dict[str, Any]):
         series_title = show.get("title")
         series_id = show.get("id")
 
         if not show.get('statistics', {}).get('episodeFileCount', 0) > 0:
-            continue
-            
+            return
+
         series_path = show.get("path")
         imdb_id = show.get("imdbId")
         tmdb_id = show.get("tmdbId")
 
-        local_series_path = find_local_path(series_path, sonarr_base_paths)
+        local_series_path = find_local_path(series_path, folder_map)
         if not local_series_path:
             print(f"\n>>> Could not find local path for '{series_title}' in base paths. Skipping show.")
-            continue
-        
-        all_episode_files = get_from_arr(sonarr_url, sonarr_api_key, f"episodefile?seriesId={series_id}")
-        all_episodes_metadata = get_from_arr(sonarr_url, sonarr_api_key, f"episode?seriesId={series_id}")
+            return
+
+        all_episode_files = files_by_series.get(series_id, [])
+        all_episodes_metadata = episodes_by_series.get(series_id, [])
 
         if not all_episode_files:
             print(f"\n>>> Show '{series_title}' has downloaded files according to stats, but API returned no details. Skipping.")
-            continue
-        
+            return
+
         episode_map = {ep['episodeFileId']: ep for ep in all_episodes_metadata if 'episodeFileId' in ep}
 
-        for episode_file in all_episode_files:
+        async def handle_episode(episode_file: Dict[str, Any]):
             episode_file_id = episode_file.get("id")
-            
-            release_group = episode_file.get('releaseGroup')
 
-            unwanted_groups = ["sickbeard", "radarr", "sonarr"]
-            if release_group and release_group.lower() in unwanted_groups:
-                print(f"\n--- Skipping episode file with generic release group ('{release_group}'): {episode_file.get('relativePath')}")
-                continue
-              
             episode_info = episode_map.get(episode_file_id)
 
             if not episode_info:
                 print(f"  -> Skipping file because it could not be mapped to an episode in Sonarr's database: {episode_file.get('relativePath')}")
-                continue
-            
+                return
+
             season_num = episode_info.get('seasonNumber')
             episode_num = episode_info.get('episodeNumber')
             episode_title = episode_info.get('title', 'Unknown Title')
-            
+
             if season_num is None or episode_num is None:
                 print(f"  -> Skipping file due to missing season/episode number in mapped data: {episode_file.get('relativePath')}")
-                continue
+                return
 
+            # Cheapest filter first: items already handled on a previous run
+            # short-circuit before any logging, path or network work
             episode_key = get_item_key("tv", tmdb_id=str(tmdb_id), season=season_num, episode=episode_num)
-            
+
             if episode_key in processed_items:
-                continue
+                return
+
+            release_group = episode_file.get('releaseGroup')
+
+            if release_group and release_group.lower() in UNWANTED_GROUPS:
+                print(f"\n--- Skipping episode file with generic release group ('{release_group}'): {episode_file.get('relativePath')}")
+                return
 
             print(f"\n--- Processing Episode: {series_title} - S{season_num:02d}E{episode_num:02d} - {episode_title} ---")
 
@@ -393,15 +608,15 @@ def process_tv_shows(sonarr_url: str, sonarr_api_key: str, sonarr_base_paths: Li
 
             if not relative_path:
                 print("  -> Could not determine video filename (relativePath) from the Sonarr API. Skipping episode.")
-                continue
+                return
 
             video_filepath = os.path.join(local_series_path, relative_path)
-            srt_path = find_matching_srt_file(video_filepath)
+            srt_path = find_matching_srt_file(video_filepath, srt_index)
 
             if not srt_path:
                 print("  -> No matching local .srt file found for this episode.")
-                continue
-            
+                return
+
             print(f"  -> Found matching subtitle file: {os.path.basename(srt_path)}")
 
             is_hi = is_hearing_impaired(os.path.basename(srt_path))
@@ -413,48 +628,48 @@ def process_tv_shows(sonarr_url: str, sonarr_api_key: str, sonarr_base_paths: Li
                 print("  -> WARNING: Could not determine release group for this episode.")
 
             print("  -> Checking for existing subtitles on SubDL...")
-            existing_subs_data = search_subtitles(
-                api_key=subdl_search_key, 
-                tmdb_id=str(tmdb_id), 
-                type="tv", 
+            existing_subs_data = await subdl.search_subtitles(
+                tmdb_id=str(tmdb_id),
+                type="tv",
                 languages=language,
                 season_number=season_num,
                 episode_number=episode_num
             )
-            
+
             found_match = False
             if existing_subs_data.get("status") and existing_subs_data.get("subtitles"):
                 if release_group:
+                    rg_cf = release_group.casefold()
                     for subtitle in existing_subs_data["subtitles"]:
-                        if any(release_group.lower() in r.lower() for r in subtitle.get('releases', [])):
+                        if any(rg_cf in r.casefold() for r in subtitle.get('releases', [])):
                             print(f"  -> Found matching subtitle for release group '{release_group}'. Skipping episode.")
-                            print("     --- Matching Subtitle Details ---")
-                            print(json.dumps(subtitle, indent=4))
+                            log.debug("Matching subtitle: %r", subtitle)
                             found_match = True
                             break
                 else:
                     print(f"  -> Found {len(existing_subs_data['subtitles'])} general subtitle(s) for this episode. Skipping because release group is unknown.")
                     found_match = True
-            
+
             if found_match:
-                save_processed_item(episode_key)
+                save_processed_item(db, episode_key)
                 processed_items.add(episode_key)
-                continue
+                return
 
             print(f"  -> No matching subtitles found for language '{language}' and release '{release_group}'.")
-            
+
             do_upload = False
             if always_upload:
                 print("  -> --always-upload-tv is set. Automatically uploading.")
                 do_upload = True
             else:
-                user_input = input(f"  ?? Do you want to upload the found subtitle file for S{season_num:02d}E{episode_num:02d}? (Y/n): ")
+                async with prompt_lock:
+                    user_input = await asyncio.to_thread(input, f"  ?? Do you want to upload the found subtitle file for S{season_num:02d}E{episode_num:02d}? (Y/n): ")
                 if user_input.lower() != 'n':
                     do_upload = True
-            
+
             if do_upload:
-                if upload_single_subtitle(
-                    subdl_upload_token=subdl_upload_token,
+                if await upload_single_subtitle(
+                    subdl,
                     file_path=srt_path,
                     media_info={
                         "type": "tv",
@@ -467,26 +682,41 @@ def process_tv_shows(sonarr_url: str, sonarr_api_key: str, sonarr_base_paths: Li
                         "is_hi": is_hi
                     }
                 ):
-                    save_processed_item(episode_key)
+                    save_processed_item(db, episode_key)
                     processed_items.add(episode_key)
 
-def upload_single_subtitle(subdl_upload_token: str, file_path: str, media_info: Dict[str, Any]) -> bool:
+        # Episodes of the same series now interleave instead of running one
+        # after another; the SubDL limiter and upload semaphore still bound
+        # the actual request rate
+        async with asyncio.TaskGroup() as tg:
+            for episode_file in all_episode_files:
+                tg.create_task(handle_episode(episode_file))
+
+    await asyncio.gather(*(handle_show(show) for show in shows))
+
+async def upload_single_subtitle(subdl: SubdlClient, file_path: str, media_info: Dict[str, Any]) -> bool:
     """
     Handles the 3-step upload process for a single subtitle file.
+    At most UPLOAD_CONCURRENCY_LIMIT uploads run at once; the semaphore is
+    acquired before the subtitle file is read so peak memory stays bounded.
     Returns True if upload was successful, False otherwise.
     """
+    async with subdl.upload_sem:
+        return await _do_upload_single_subtitle(subdl, file_path, media_info)
+
+async def _do_upload_single_subtitle(subdl: SubdlClient, file_path: str, media_info: Dict[str, Any]) -> bool:
     print(f"  -> Starting upload for: {os.path.basename(file_path)}")
-    n_id = get_n_id(subdl_upload_token)
+    n_id = await subdl.get_n_id()
     if not n_id:
         print("     Failed to get upload session ID. Aborting upload for this file.")
         return False
 
     print(f"     Got session ID: {n_id}")
-    file_info = upload_subtitle_file(subdl_upload_token, n_id, file_path)
+    file_info = await subdl.upload_subtitle_file(n_id, file_path)
     if not file_info or "file_n_id" not in file_info:
         print("     Failed to upload file. Aborting upload for this file.")
         return False
-    
+
     file_n_id = file_info["file_n_id"]
     print(f"     File uploaded successfully. File ID: {file_n_id}")
 
@@ -500,7 +730,7 @@ def upload_single_subtitle(subdl_upload_token: str, file_path: str, media_info:
         "lang": media_info["lang"],
         "quality": "web", # Defaulting to web, can be improved
         "production_type": 0,
-        "releases": json.dumps([os.path.basename(file_path).replace('.srt', '')]),
+        "releases": orjson.dumps([os.path.basename(file_path).replace('.srt', '')]).decode(),
         "framerate": 0,
         "comment": "Uploaded via script",
         "season": media_info["season"],
@@ -509,12 +739,42 @@ def upload_single_subtitle(subdl_upload_token: str, file_path: str, media_info:
         "hi": str(is_hi).lower(),
         "is_full_season": "false",
     }
-    
+
     print("     Submitting metadata...")
-    success = complete_subtitle_upload(subdl_upload_token, n_id, file_n_id, metadata)
+    success = await subdl.complete_subtitle_upload(n_id, file_n_id, metadata)
     return success
 
+async def main_async(args):
+    radarr_base_paths = [p.strip() for p in args.radarr_base_paths.split(',')]
+    sonarr_base_paths = [p.strip() for p in args.sonarr_base_paths.split(',')]
+
+    db = open_processed_db()
+    import_legacy_log(db)
+    processed_items = load_processed_list(db)
+    print(f"Loaded {len(processed_items)} previously processed items.")
+
+    try:
+        connector = aiohttp.TCPConnector(limit_per_host=8, limit=64)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            subdl = SubdlClient(session, args.subdl_search_key, args.subdl_upload_token, db=db)
+            radarr = ArrClient(session, args.radarr_url, args.radarr_api_key)
+            sonarr = ArrClient(session, args.sonarr_url, args.sonarr_api_key)
+            # The two library fetches hit different hosts, so overlap them,
+            # then let the movie and TV phases interleave on the same limiter
+            movies, shows = await asyncio.gather(radarr.get("movie"), sonarr.get("series"))
+            await asyncio.gather(
+                process_movies(movies, subdl, radarr_base_paths, args.language, db, processed_items, args.always_upload_movie),
+                process_tv_shows(shows, sonarr, subdl, sonarr_base_paths, args.language, db, processed_items, args.always_upload_tv)
+            )
+    finally:
+        db.commit()
+        db.close()
+
 def main():
+    # Flush every print immediately so progress is visible when stdout is a
+    # pipe or nohup log instead of a terminal
+    sys.stdout.reconfigure(line_buffering=True)
+
     parser = argparse.ArgumentParser(description="Find local subtitles and upload them to SubDL.")
     # Radarr Args
     parser.add_argument("--radarr-url", required=True, help="URL for your Radarr instance.")
@@ -531,17 +791,13 @@ def main():
     # New Control Args
     parser.add_argument("--always-upload-tv", action="store_true", help="Automatically answer 'yes' to all TV show upload prompts.")
     parser.add_argument("--always-upload-movie", action="store_true", help="Automatically upload subtitles for movies without prompting.")
+    parser.add_argument("--verbose", action="store_true", help="Enable debug output (full API responses and subtitle details).")
 
     args = parser.parse_args()
 
-    radarr_base_paths = [p.strip() for p in args.radarr_base_paths.split(',')]
-    sonarr_base_paths = [p.strip() for p in args.sonarr_base_paths.split(',')]
-
-    processed_items = load_processed_list()
-    print(f"Loaded {len(processed_items)} previously processed items.")
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(message)s")
 
-    process_movies(args.radarr_url, args.radarr_api_key, radarr_base_paths, args.subdl_search_key, args.subdl_upload_token, args.language, processed_items, args.always_upload_movie)
-    process_tv_shows(args.sonarr_url, args.sonarr_api_key, sonarr_base_paths, args.subdl_search_key, args.subdl_upload_token, args.language, processed_items, args.always_upload_tv)
+    asyncio.run(main_async(args))
 
 if __name__ == "__main__":
     main()